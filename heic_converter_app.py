@@ -6,28 +6,72 @@ HEIC/HEIF を PNG / JPEG に一括変換する Tkinter GUI（診断ログ強化
 - 起動時に環境情報（Pillow / pillow-heif / OS / HEIF対応状況）を表示
 """
 
+import gc
+import io
+import os
+import shutil
 import sys
 import platform
+import queue
 import threading
+import time
 import traceback
+import warnings
+import multiprocessing
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
 
 # --- 画像処理 / HEIF対応 ---
 from PIL import Image, ImageOps, UnidentifiedImageError, features  # Pillow本体
-import pillow_heif  # HEIC/HEIFデコーダ（フォールバックにも使用）
-pillow_heif.register_heif_opener()  # Pillow側のオープナー登録（効かない環境もあるが害はない）
-Image.MAX_IMAGE_PIXELS = None       # 超高解像度でも警告で止まらないように
+# 解凍爆弾チェックは残し、上限だけ写真用途（48MP 程度）に十分な値へ広げる
+MAX_IMAGE_PIXELS = 200_000_000
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+# HEIC/HEIFデコーダ（読込の第一経路。読み込めない環境では Image.open のみで動作）
+pillow_heif_loaded = False
+try:
+    import pillow_heif
+    pillow_heif_loaded = True
+except Exception:
+    pillow_heif = None
+
+heif_register_ok = False
+if pillow_heif_loaded:
+    try:
+        pillow_heif.register_heif_opener()  # Pillow側のオープナー登録（効かない環境もあるが害はない）
+        heif_register_ok = True
+    except Exception:
+        pass
+
+# Pillow 単体の HEIF 対応（起動時に1回だけ判定）。features は環境によって 'heif' が Unknown になるので安全に
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # 未知の feature 名は UserWarning になる（ワーカー起動ごとに出さない）
+        HEIF_VIA_PILLOW = bool(features.check("heif") or features.check("heif_decoder"))
+except Exception:
+    HEIF_VIA_PILLOW = False
 
 # pillow-heif の情報を環境ダンプ用に取得
-pillow_heif_loaded = True
-heif_register_ok = True
+heif_summary_text = None
+if pillow_heif_loaded:
+    try:
+        ver = getattr(pillow_heif, "__version__", "unknown")
+        compilers = getattr(pillow_heif, "compiled_with", lambda: None)()
+        heif_summary_text = f"pillow-heif version: {ver}; compiled_with: {compilers}"
+    except Exception:
+        heif_summary_text = None
+
+# JPEG エンコーダ（libjpeg-turbo なら SIMD 対応）の情報を環境ダンプ用に取得
+jpeg_turbo_ok = False
 try:
-    ver = getattr(pillow_heif, "__version__", "unknown")
-    compilers = getattr(pillow_heif, "compiled_with", lambda: None)()
-    heif_summary_text = f"pillow-heif version: {ver}; compiled_with: {compilers}"
+    jpeg_turbo_ok = bool(features.check_feature("libjpeg_turbo"))
+    turbo_ver = features.version_feature("libjpeg_turbo") if jpeg_turbo_ok else None
+    jpeg_summary_text = f"libjpeg: {features.version('jpg')}; libjpeg-turbo: {turbo_ver or False}"
 except Exception:
-    heif_summary_text = None
+    jpeg_summary_text = None
 
 # --- GUI部品 ---
 import tkinter as tk
@@ -41,169 +85,546 @@ try:
 except Exception:
     DND_AVAILABLE = False
 
-SUPPORTED_EXTS = {".heic", ".heif", ".HEIC", ".HEIF"}
+SUPPORTED_EXTS = frozenset({".heic", ".heif"})  # 判定は suffix.lower() で行う（O(1) の集合判定）
+HEIC_SUFFIXES = tuple(sorted(SUPPORTED_EXTS))  # str.endswith 用
+# フォルダ走査で降りないフォルダ（隠しフォルダ "." 始まりも除外）
+PRUNE_DIRS = frozenset({"node_modules", "__pycache__", ".git", "$RECYCLE.BIN", "System Volume Information"})
+
+EXIF_ORIENTATION = 0x0112  # EXIF Orientation タグ
+
+# ワーカー → UI 通知の間引き（秒）
+PROGRESS_INTERVAL = 0.05
+LOG_FLUSH_INTERVAL = 0.25
+
+# Windows の ProcessPoolExecutor は max_workers > 61 を明示すると ValueError になる（WaitForMultipleObjects の上限）
+# 標準ライブラリも max_workers=None のときは同じ値で頭打ちにしている
+WIN_MAX_WORKERS = 61
+
+# HEIF デコードのスレッド数を固定したい場合の環境変数（未設定なら コア数 ÷ プロセス数）
+DECODE_THREADS_ENV = "HEIC_DECODE_THREADS"
+
+# GUIログ：保持する行数の上限と再描画間隔（ミリ秒）
+LOG_MAX_LINES = 5000
+LOG_REFRESH_MS = 200
+UI_POLL_MS = 50  # ワーカー → UI 通知キューの処理間隔（ミリ秒）
+
+# ワーカーで循環参照の回収（gc.collect）を行う間隔（ファイル数）
+GC_EVERY_FILES = 32
 
 
 # =============================================================================
 # ユーティリティ
 # =============================================================================
 
+def _walk_heic(root: Path):
+    """root 以下の HEIC/HEIF を列挙する（os.scandir による反復走査）
+    隠しフォルダや HEIC が入らないフォルダ（.git, node_modules 等）は降りない。
+    DirEntry が stat 結果をキャッシュするので、rglob よりシステムコールが少ない。
+    """
+    stack = [os.fspath(root)]
+    while stack:
+        d = stack.pop()
+        try:
+            it = os.scandir(d)
+        except OSError:
+            continue  # 権限のないフォルダなどは飛ばす
+        subdirs = []
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith(".") and entry.name not in PRUNE_DIRS:
+                            subdirs.append(entry.path)
+                    elif entry.name.lower().endswith(HEIC_SUFFIXES) and entry.is_file():
+                        yield Path(entry.path)
+                except OSError:
+                    continue
+        stack.extend(reversed(subdirs))  # 見つけた順に深さ優先で辿る
+
+
 def collect_heic_files(paths: List[Path]) -> List[Path]:
     """入力パス（ファイル/フォルダ混在）から HEIC/HEIF を収集（順序維持・重複排除）"""
     files: List[Path] = []
     for p in paths:
         p = Path(p)
-        if p.is_dir():
-            for ext in SUPPORTED_EXTS:
-                files.extend(p.rglob(f"*{ext}"))
-        elif p.is_file() and p.suffix in SUPPORTED_EXTS:
+        # 拡張子（文字列判定）を先に見て、入力1件あたりの stat を1回にする
+        if p.suffix.lower() in SUPPORTED_EXTS and p.is_file():
             files.append(p)
-    seen = set()
-    uniq: List[Path] = []
-    for f in files:
-        if f not in seen:
-            uniq.append(f)
-            seen.add(f)
-    return uniq
-
-
-def safe_output_path(src: Path, out_dir: Optional[Path], out_ext: str) -> Path:
-    """出力先パスを決定（同名があれば _1, _2… を付与）"""
-    base = src.stem
-    dir_ = out_dir if out_dir else src.parent
-    candidate = dir_ / f"{base}{out_ext}"
-    idx = 1
-    while candidate.exists():
-        candidate = dir_ / f"{base}_{idx}{out_ext}"
-        idx += 1
-    return candidate
+        elif p.is_dir():
+            files.extend(_walk_heic(p))
+    return list(dict.fromkeys(files))  # 順序を保ったまま重複排除
+
+
+class OutputPathAllocator:
+    """出力先フォルダ単位で出力パスを割り当てる（同名があれば _1, _2… を付与）
+    生成時に os.scandir で既存のファイル名を1回だけ集め、以降の衝突判定と予約はメモリ上で行う。
+    （候補ごとに exists() を呼ぶと、同名が多いフォルダで stat が O(N²) になるため）
+    """
+    def __init__(self, dir_: Path, out_ext: str):
+        self.dir = dir_
+        self.out_ext = out_ext
+        # casefold 済みのファイル名。macOS や exFAT/NTFS/SMB など大文字小文字を区別しないボリュームでは
+        # POSIX の normcase だと IMG.JPG と IMG.jpg を別名と見なして上書きしてしまうため、常に区別せずに比べる
+        # （区別するファイルシステムでは余計に _1 が付くだけで、上書きは起きない）
+        self.taken: Set[str] = set()
+        self._next_idx: Dict[str, int] = {}  # stem ごとに次に試す連番（同名が多くても先頭から数え直さない）
+        ext = out_ext.casefold()
+        try:
+            with os.scandir(dir_) as it:
+                for entry in it:
+                    name = entry.name.casefold()
+                    if name.endswith(ext):
+                        self.taken.add(name)
+        except OSError:
+            pass  # 出力先がまだ無い場合など（保存時に作成する）
+        self.existing = frozenset(self.taken)  # 実行前から存在した名前
+
+    def existed(self, stem: str) -> bool:
+        """接尾辞なしの出力名（stem + 拡張子）が実行前から存在したか"""
+        return f"{stem}{self.out_ext}".casefold() in self.existing
+
+    def allocate(self, stem: str) -> Path:
+        """stem に対する未使用の出力パスを返し、その名前を予約する"""
+        key = stem.casefold()
+        idx = self._next_idx.get(key, 0)
+        name = f"{stem}{self.out_ext}" if idx == 0 else f"{stem}_{idx}{self.out_ext}"
+        while name.casefold() in self.taken:
+            idx += 1
+            name = f"{stem}_{idx}{self.out_ext}"
+        self.taken.add(name.casefold())
+        self._next_idx[key] = idx + 1
+        return self.dir / name
+
+
+def _heif_to_pillow(hf):
+    """HeifFile の主画像を Pillow Image にする（HeifFile.to_pillow の代わり）
+    Image.frombuffer はデコード済みバッファをコピーせずに参照する（RGBA 等 Pillow が直接
+    マップできるモードのみ。RGB は Pillow 内部でコピーになる）。参照先は hf.data の memoryview が
+    保持するので、hf を手放しても画素は有効。マップした画像は読み取り専用で、以降の
+    transpose/convert は新しい画像を作る（元バッファは書き換えない）。
+    """
+    im = Image.frombuffer(hf.mode, hf.size, hf.data, "raw", hf.mode, hf.stride, 1)
+    # EXIF/ICC は HeifFile 側の info から取る（Pillow 側のラッパーは落とすことがある）
+    im.info = hf.info.copy()
+    # libheif はデコード時に回転を適用済みなので、EXIF の Orientation を 1 に戻す（二重回転防止）
+    pillow_heif.set_orientation(im.info)
+    return im
 
 
 def open_image_any(path: Path):
     """HEIC/HEIF を“必ず” Pillow Image として開く。
-    1) まず Image.open を試す（成功時は EXIF/ICC も取得）
-    2) 失敗したら pillow_heif.open_heif → Image.frombytes で PIL 画像化
+    1) まず pillow_heif.open_heif で直接開く（Pillow のオープナー探索を通らず、
+       サムネイル等の付属画像も展開しない。EXIF/ICC は HeifFile から取得）
+    2) 失敗したら（pillow-heif 未導入・中身が HEIF でない等）Image.open
     戻り値: (pil_image, exif_bytes or None, icc_bytes or None)
     """
-    # 通常ルート（環境によっては HEIC で失敗する）
+    heif_error = None
+    if pillow_heif_loaded:
+        try:
+            # 色変換は libheif のデコード時に1回で済ませる：YCbCr → 8bit RGB(A) を直接出力させる
+            # （10/12bit HDR も 8bit で受け取るので、JPEG 保存前の convert は α付き/グレーの場合だけ）
+            hf = pillow_heif.open_heif(path, convert_hdr_to_8bit=True, bgr_mode=False)
+        except Exception as e:
+            heif_error = e  # 拡張子だけ .heic の PNG/JPEG などは Image.open に任せる
+        else:
+            # 画素データのデコード前にサイズだけで上限を判定する
+            w, h = hf.size
+            if Image.MAX_IMAGE_PIXELS and w * h > Image.MAX_IMAGE_PIXELS:
+                raise Image.DecompressionBombError(
+                    f"画素数 {w * h} が上限 {Image.MAX_IMAGE_PIXELS} を超えています（{w}x{h}）")
+            im = _heif_to_pillow(hf)
+            return im, im.info.get("exif"), im.info.get("icc_profile")
+
+    # 通常ルート
     try:
         im = Image.open(path)
-        exif_bytes = im.info.get("exif")
-        icc = im.info.get("icc_profile")
-        return im, exif_bytes, icc
     except UnidentifiedImageError:
-        pass  # フォールバックへ
+        if heif_error is not None:
+            raise heif_error  # HEIF として壊れている場合は pillow-heif 側のエラーの方が有用
+        raise
+    exif_bytes = im.info.get("exif")
+    icc = im.info.get("icc_profile")
+    return im, exif_bytes, icc
 
-    # フォールバック：pillow-heif で直にHEIFを開く
-    hf = pillow_heif.open_heif(path)
 
-    # EXIFの取り出し（あれば）
-    exif_bytes = None
+def jpeg_qtables(quality: int) -> List[List[int]]:
+    """指定品質で libjpeg が使う量子化テーブルを取得する（小さな画像を1回だけ試し保存して読み戻す）
+    バッチ全体で同じテーブルを qtables= に渡すと、quality= 指定と同一の出力になる。
+    """
+    buf = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(buf, "JPEG", quality=quality, subsampling=2)
+    buf.seek(0)
+    with Image.open(buf) as probe:
+        return [list(t) for _, t in sorted(probe.quantization.items())]
+
+
+# =============================================================================
+# 変換ワーカー（プロセスプール）
+# =============================================================================
+
+def heif_decode_threads(workers: int) -> int:
+    """1ファイルのデコードに使う libheif のスレッド数
+    （タイル分割された HEIC は並列デコードできる）。プロセス数 × スレッド数がコア数に収まるように
+    割り当てる。環境変数 HEIC_DECODE_THREADS があればそれを優先。
+    """
+    env = os.environ.get(DECODE_THREADS_ENV)
+    if env:
+        try:
+            return max(1, int(env))
+        except ValueError:
+            pass
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _init_worker(decode_threads: int = 1):
+    """ワーカープロセスの初期化（spawn 環境でもメイン側と同じ設定にする）
+    オープナーはモジュール import 時に登録済みなので、ここでは pillow-heif のオプションだけ設定する。
+    """
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    if pillow_heif_loaded:
+        opts = pillow_heif.options
+        opts.THUMBNAILS = False  # Apple の HEIC に埋め込まれたサムネイルは読まない
+        # ファイル単位でも並列化しているので、コア数を超えないスレッド数にする（heif_decode_threads）
+        opts.DECODE_THREADS = decode_threads
+        if hasattr(opts, "ALLOW_INCORRECT_HEADERS"):  # 古い pillow-heif のみ
+            opts.ALLOW_INCORRECT_HEADERS = True
+
+
+_files_since_gc = 0  # ワーカープロセスごとのカウンタ
+
+
+def _collect_garbage_periodically():
+    """GC_EVERY_FILES 件ごとに gc.collect する
+    画像は参照カウントで即解放されるが、例外のトレースバック等の循環参照は世代 GC 任せになり、
+    長時間動くワーカーで回収が遅れると大きなバッファが残ることがあるため。
+    """
+    global _files_since_gc
+    _files_since_gc += 1
+    if _files_since_gc >= GC_EVERY_FILES:
+        _files_since_gc = 0
+        gc.collect()
+
+
+def _abs_path(src: Path) -> str:
+    """ログ用の絶対パス（resolve はネットワークドライブで遅いので、エラー表示時だけ呼ぶ）"""
     try:
-        for md in getattr(hf, "metadata", []) or []:
-            # 例: {'type': 'Exif', 'data': b'...'}
-            if md.get("type", "").lower() == "exif" and md.get("data"):
-                exif_bytes = md["data"]
-                break
-    except Exception:
-        pass
+        return str(src.resolve())
+    except OSError:
+        return os.fspath(src)
+
+
+def _replace_image(old, new):
+    """変換で新しい画像ができたら元の画像をすぐ閉じる（48MP 級で数百MBのコピーを溜めないため）"""
+    if new is not old:
+        old.close()
+    return new
+
 
-    # ICCプロファイル（あれば）
-    icc = None
+def _can_pass_through(im, fmt: str, exif_bytes, keep_exif: bool) -> bool:
+    """中身が既に出力形式の画像（拡張子だけ .heic の JPEG/PNG 等）を、再エンコードせずにコピーしてよいか
+    回転補正・EXIF の除去・複数フレームの切り出し・RGB 以外の JPEG（CMYK/グレー）の変換が
+    必要なものは、コピーだと結果が変わるので対象外。
+    """
+    if im.format != fmt or getattr(im, "n_frames", 1) > 1:
+        return False
+    if fmt == "JPEG" and im.mode != "RGB":  # 通常の変換では convert("RGB") される
+        return False
+    if im.getexif().get(EXIF_ORIENTATION, 1) not in (0, 1):
+        return False
+    # PNG は元から EXIF を書かないが、コピーなら元ファイルのメタデータがそのまま残るだけなので許容
+    return fmt != "JPEG" or keep_exif or not exif_bytes
+
+
+def _convert_one(src: Path, out_path: Path, fmt: str, base_kwargs: dict, keep_exif: bool):
+    """1ファイルを変換する（ワーカープロセスで実行されるため、トップレベル関数で picklable）
+    base_kwargs: バッチ共通の保存パラメータ（ConverterThread で1回だけ組み立てる）。
+    ここではファイルごとに変わる EXIF/ICC だけを足す。
+    戻り値: (src, out_path, warns, error_str or None)
+    """
+    warns: List[str] = []
+    im = None
     try:
-        cp = getattr(hf, "color_profile", None)  # 例: {'type':'icc','icc_profile': b'...'}
-        if isinstance(cp, dict) and cp.get("icc_profile"):
-            icc = cp["icc_profile"]
-    except Exception:
-        pass
+        # --- 画像を開く（open_heif → 失敗時 Image.open フォールバック） ---
+        im, exif_bytes, icc = open_image_any(src)
+
+        # 中身が既に出力形式なら、デコード・再エンコードせずにバイト列をそのままコピーする
+        # （copyfile は Linux では copy_file_range/sendfile、Windows では CopyFile2 を使う）
+        if _can_pass_through(im, fmt, exif_bytes, keep_exif):
+            im.close()
+            im = None
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = out_path.with_name(out_path.name + ".part")
+            try:
+                shutil.copyfile(src, tmp_path)
+                os.replace(tmp_path, out_path)
+            except Exception as e:
+                try:
+                    tmp_path.unlink()
+                except OSError:
+                    pass
+                raise RuntimeError(f"[Copy] で失敗: {e}（dest={out_path}）")
+            warns.append(f"→ 中身が既に {fmt} のため再エンコードせずコピー: {src.name}")
+            return src, out_path, warns, None
+
+        # アニメーションHEIF対策：先頭フレームを選択
+        try:
+            if getattr(im, "n_frames", 1) > 1:
+                im.seek(0)
+        except Exception as e:
+            warns.append(f"！警告: フレームseekに失敗 ({e})")
+
+        # EXIFの回転情報を反映（縦横を正しく）
+        # Orientation が 1（回転なし）・0（不正値）・タグなしのときは exif_transpose が
+        # 全画素コピーを作るだけなので呼ばない
+        try:
+            if im.getexif().get(EXIF_ORIENTATION, 1) not in (0, 1):
+                im = _replace_image(im, ImageOps.exif_transpose(im))
+        except Exception as e:
+            warns.append(f"！警告: 回転補正に失敗 ({e})")
+
+        # 保存パラメータ（共通部分 + ファイルごとのメタデータ）
+        save_kwargs = dict(base_kwargs)
+        if fmt == "JPEG":
+            if icc:
+                save_kwargs["icc_profile"] = icc
+            if keep_exif and exif_bytes:
+                save_kwargs["exif"] = exif_bytes
+            if im.mode != "RGB":  # JPEGはRGB前提（HEIC はデコード時点で RGB なので、通常は α付き/グレーのみ変換）
+                im = _replace_image(im, im.convert("RGB"))
+        # PNG は必要なら ICC を入れる
+        # elif icc:
+        #     save_kwargs["icc_profile"] = icc
+
+        # 出力ディレクトリを作成して保存
+        # メモリ上でエンコードしてから一括書き込み → os.replace（細かい write を避け、途中で落ちても
+        # 書きかけのファイルが出力名で残らない）
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = out_path.with_name(out_path.name + ".part")
+        try:
+            buf = io.BytesIO()
+            im.save(buf, fmt, **save_kwargs)
+            im.close()  # 書き込み前にデコード済み画素を手放す
+            im = None
+            # エンコード済みバイト列を丸ごと渡すので、バッファサイズに関係なく write は1回で済む
+            with open(tmp_path, "wb") as f:
+                f.write(buf.getbuffer())
+            del buf  # エンコード済みバイト列も戻り値を待たずに手放す
+            os.replace(tmp_path, out_path)
+        except Exception as e:
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            raise RuntimeError(f"[Save] で失敗: {e}（dest={out_path}）")
 
-    # Pillow Image を生で構築
-    im = Image.frombytes(hf.mode, hf.size, hf.data, "raw")
-    return im, exif_bytes, icc
+        return src, out_path, warns, None
 
+    except Image.DecompressionBombError as e:
+        # 異常に大きい画像はスタックトレース不要。理由だけ返してスキップ
+        return src, out_path, warns, f"[Open] 画像が大きすぎるためスキップ: {e}"
+    except Exception:
+        # フルスタックを呼び出し元へ返す（GUIログに出す）
+        return src, out_path, warns, traceback.format_exc()
+    finally:
+        if im is not None:
+            im.close()
+        _collect_garbage_periodically()
 
-# =============================================================================
-# 変換ワーカースレッド
-# =============================================================================
 
 class ConverterThread(threading.Thread):
-    """変換をバックグラウンドで実行（UI操作はコールバック経由でメインスレッドへ）"""
+    """変換をバックグラウンドで実行（UI操作はコールバック経由でメインスレッドへ）
+    実際の変換はプロセスプールに投げ、ファイル単位で CPU コア数だけ並列化する。
+    """
     def __init__(self, files: List[Path], out_dir: Optional[Path], fmt: str,
-                 jpg_quality: int, keep_exif: bool, progress_cb, log_cb, done_cb):
+                 jpg_quality: int, keep_exif: bool, progress_cb, log_cb, done_cb,
+                 png_compress_level: int = 1, jpg_optimize: bool = False,
+                 skip_existing: bool = False):
         super().__init__(daemon=True)
         self.files = files
         self.out_dir = out_dir
         self.fmt = fmt
         self.jpg_quality = jpg_quality
         self.keep_exif = keep_exif
+        self.png_compress_level = png_compress_level
+        self.jpg_optimize = jpg_optimize
+        self.skip_existing = skip_existing
+        self._out_ext = ".png" if fmt == "PNG" else ".jpg"
+        self._base_kwargs = self._build_base_kwargs()
         self.progress_cb = progress_cb
         self.log_cb = log_cb
         self.done_cb = done_cb
 
-    def run(self):
-        total = len(self.files)
-        count = 0
-        for src in self.files:
-            abs_src = str(Path(src).resolve())
+    def _build_base_kwargs(self) -> dict:
+        """バッチ内で変わらない保存パラメータを1回だけ組み立てる"""
+        if self.fmt == "JPEG":
+            kwargs = {}
+            # 品質→量子化テーブルの変換もここで1回だけ行う（quality= と同じ結果）
             try:
-                self.log_cb(f"… 開始: {abs_src}")
-                out_ext = ".png" if self.fmt == "PNG" else ".jpg"
-                out_path = safe_output_path(src, self.out_dir, out_ext)
-
-                # --- 画像を開く（Image.open → 失敗時 open_heif フォールバック） ---
-                im, exif_bytes, icc = open_image_any(src)
-
-                # アニメーションHEIF対策：先頭フレームを選択
-                try:
-                    if getattr(im, "n_frames", 1) > 1:
-                        im.seek(0)
-                except Exception as e:
-                    self.log_cb(f"！警告: フレームseekに失敗 ({e})")
+                kwargs["qtables"] = jpeg_qtables(self.jpg_quality)
+            except Exception:
+                kwargs["quality"] = self.jpg_quality  # 取得できなければ従来どおり quality= で保存
+            # ベースライン（非プログレッシブ）で出力。HEIC 側も 4:2:0 なので同じ間引きを明示（2=4:2:0）
+            kwargs["subsampling"] = 2
+            # Huffman 最適化はエンコード時間がほぼ倍になる割にサイズ差が数%なので任意
+            if self.jpg_optimize:
+                kwargs["optimize"] = True
+            return kwargs
+        # PNGはどのレベルでも可逆圧縮（レベルはサイズと速度のトレードオフのみ）
+        # optimize=True は zlib レベル9 + フィルタ探索で極端に遅いので使わない
+        return {"compress_level": self.png_compress_level}
 
-                # EXIFの回転情報を反映（縦横を正しく）
-                try:
-                    im = ImageOps.exif_transpose(im)
-                except Exception as e:
-                    self.log_cb(f"！警告: 回転補正に失敗 ({e})")
-
-                # 保存パラメータを用意
-                save_kwargs = {}
-                if self.fmt == "JPEG":
-                    save_kwargs["quality"] = self.jpg_quality
-                    save_kwargs["optimize"] = True
-                    save_kwargs["progressive"] = True
-                    # 指定したい場合のみ（2=4:2:0）：save_kwargs["subsampling"] = 2
-                    if icc:
-                        save_kwargs["icc_profile"] = icc
-                    if self.keep_exif and exif_bytes:
-                        save_kwargs["exif"] = exif_bytes
-                    if im.mode != "RGB":  # JPEGはRGB前提
-                        im = im.convert("RGB")
-                else:
-                    # PNGは可逆圧縮
-                    save_kwargs["optimize"] = True
-                    # 必要なら ICC を入れる
-                    # if icc:
-                    #     save_kwargs["icc_profile"] = icc
-
-                # 出力ディレクトリを作成して保存
-                out_path.parent.mkdir(parents=True, exist_ok=True)
-                try:
-                    im.save(out_path, self.fmt, **save_kwargs)
-                except Exception as e:
-                    raise RuntimeError(f"[Save] で失敗: {e}（dest={out_path}）")
+    def run(self):
+        # 想定外の例外で抜けても done_cb は必ず呼ぶ（開始ボタンが無効のまま戻らなくなるため）
+        try:
+            self._run_batch()
+        except Exception:
+            self._log_now(f"✖ エラー: 変換を中断しました\n{traceback.format_exc()}")
+        finally:
+            self.done_cb()
+
+    def _run_batch(self):
+        out_ext = self._out_ext
+
+        # 進捗と UI 通知の間引き用
+        self._total = len(self.files)
+        self._count = 0
+        self._log_buf: List[str] = []
+        self._last_flush = time.monotonic()
+        self._sent_count = 0
+        self._sent_time = time.monotonic()
+        self._progress_step = max(1, self._total // 100)
+
+        # 出力パスは並列実行前にここで確定させる（ワーカー間の同名衝突を防ぐ）
+        allocators: Dict[Path, OutputPathAllocator] = {}
+        jobs: Deque[Tuple[Path, Path]] = deque()
+        for src in self.files:
+            dir_ = self.out_dir if self.out_dir else src.parent
+            alloc = allocators.get(dir_)
+            if alloc is None:
+                alloc = allocators[dir_] = OutputPathAllocator(dir_, out_ext)
+            if self.skip_existing and alloc.existed(src.stem):
+                # 変換済み：デコードせずに飛ばす
+                self._log(f"→ スキップ（出力済み）: {src.name}")
+                self._count += 1
+                continue
+            jobs.append((src, alloc.allocate(src.stem)))
+
+        max_workers = max(1, min(os.cpu_count() or 1, len(jobs)))
+        if sys.platform == "win32":
+            max_workers = min(max_workers, WIN_MAX_WORKERS)
+        self.log_cb(f"… 並列数: {max_workers} プロセス × デコード {heif_decode_threads(max_workers)} スレッド")
+
+        while jobs:
+            suspects = self._run_pool(jobs, max_workers)
+            if suspects:
+                # ワーカーが異常終了してプールが壊れた（デコーダのクラッシュ等）。
+                # 巻き込まれただけのファイルを救うため、処理中だったものを1件ずつ隔離して再実行する
+                self._log_now(f"！警告: ワーカープロセスが異常終了しました。処理中だった {len(suspects)} 件を個別に再実行します")
+                for job in suspects:
+                    self._run_pool(deque([job]), 1, isolated=True)
+
+        self._report_progress(force=True)  # 全件スキップ時など
+        self._flush_log()
+
+    def _run_pool(self, jobs: Deque[Tuple[Path, Path]], max_workers: int,
+                  isolated: bool = False) -> List[Tuple[Path, Path]]:
+        """jobs をプロセスプールで処理する（取り出した分は jobs から消える）
+        プールが壊れたら新規投入をやめ、その時点で処理中だったジョブを返す。
+        isolated=True（1件だけの再実行）で壊れた場合は、そのファイルをエラーとして報告する。
+        """
+        suspects: List[Tuple[Path, Path]] = []
+        broken = False
+        # 投入中のタスク数に上限を設ける（有界キュー）。各ワーカーに次の1件を先行投入して
+        # デコード/エンコードを途切れさせない一方、巨大バッチでも全件を一度に抱え込まない。
+        max_in_flight = max_workers * 2
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(heif_decode_threads(max_workers),)) as pool:
+            futures = {}
+
+            def submit_next(n: int):
+                nonlocal broken
+                while jobs and n > 0 and not suspects and not broken:
+                    job = jobs.popleft()
+                    src, out_path = job
+                    try:
+                        fut = pool.submit(_convert_one, src, out_path, self.fmt,
+                                          self._base_kwargs, self.keep_exif)
+                    except (BrokenProcessPool, RuntimeError):
+                        # ワーカーの異常終了直後は、処理中の Future が失敗する前にプールが
+                        # 壊れた状態になり、完了分だけ返った wait の後の submit が例外になる
+                        jobs.appendleft(job)
+                        broken = True
+                        return
+                    futures[fut] = job
+                    n -= 1
+
+            submit_next(max_in_flight)
+            while futures:
+                # timeout 付きで待ち、完了が途切れてもバッファ済みのログ/進捗を流す
+                done, _ = wait(futures, timeout=LOG_FLUSH_INTERVAL, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    job = futures.pop(fut)
+                    src = job[0]
+                    try:
+                        _, out_path, warns, error = fut.result()
+                    except BrokenProcessPool:
+                        if not isolated:
+                            suspects.append(job)  # 進捗は再実行の結果で数える
+                            continue
+                        self._log_now(f"✖ エラー: {_abs_path(src)}\n[Worker] 変換中にワーカープロセスが異常終了しました")
+                    except Exception:
+                        tb = traceback.format_exc()
+                        self._log_now(f"✖ エラー: {_abs_path(src)}\n{tb}")
+                    else:
+                        for w in warns:
+                            self._log(w)
+                        if error:
+                            self._log_now(f"✖ エラー: {_abs_path(src)}\n{error}")
+                        else:
+                            self._log(f"✔ 変換完了: {src.name} → {out_path.name}")
+                    self._count += 1
+                submit_next(len(done))
+
+                self._report_progress()
+                if time.monotonic() - self._last_flush >= LOG_FLUSH_INTERVAL:
+                    self._flush_log()
+
+        if broken and not suspects and jobs:
+            if isolated:
+                # 1件だけのプールでも投入できなかった（ワーカーの起動自体が失敗している等）
+                src = jobs.popleft()[0]
+                self._log_now(f"✖ エラー: {_abs_path(src)}\n[Worker] ワーカープロセスを起動できませんでした")
+                self._count += 1
+            else:
+                # 処理中のものが無いまま壊れた場合も、次の1件を隔離実行に回して必ず前に進める
+                suspects.append(jobs.popleft())
+        return suspects
+
+    def _report_progress(self, force: bool = False):
+        """1% 進むか PROGRESS_INTERVAL 経過したときだけ progress_cb を呼ぶ"""
+        now = time.monotonic()
+        count = self._count
+        if count == self._sent_count:
+            return
+        if (force or count == self._total or count - self._sent_count >= self._progress_step
+                or now - self._sent_time > PROGRESS_INTERVAL):
+            self._sent_count, self._sent_time = count, now
+            self.progress_cb(count, self._total)
 
-                self.log_cb(f"✔ 変換完了: {src.name} → {out_path.name}")
+    def _log(self, msg: str):
+        """成功/警告ログはバッファし、LOG_FLUSH_INTERVAL ごとにまとめて送る"""
+        self._log_buf.append(msg)
 
-            except Exception:
-                # フルスタックをGUIログへ
-                tb = traceback.format_exc()
-                self.log_cb(f"✖ エラー: {abs_src}\n{tb}")
-            finally:
-                count += 1
-                self.progress_cb(count, total)
+    def _log_now(self, msg: str):
+        """エラーは即時送る（順序を保つため先にバッファを流す）"""
+        self._flush_log()
+        self.log_cb(msg)
 
-        self.done_cb()
+    def _flush_log(self):
+        self._last_flush = time.monotonic()
+        if self._log_buf:
+            self.log_cb("\n".join(self._log_buf))
+            self._log_buf.clear()
 
 
 # =============================================================================
@@ -215,6 +636,7 @@ class App:
         self.root = root
         self.root.title("HEIC → PNG/JPEG 一括変換（診断ログ強化）")
         self.files: List[Path] = []
+        self._files_set: Set[Path] = set()  # self.files と同期（重複判定を O(1) にする）
         self.out_dir: Optional[Path] = None
 
         outer = ttk.Frame(root, padding=12)
@@ -264,6 +686,21 @@ class App:
         ttk.Button(opts, text="出力先を選択…", command=self.choose_out_dir)\
             .grid(row=1, column=5, sticky="e", pady=(8, 0))
 
+        ttk.Label(opts, text="PNG圧縮レベル:").grid(row=2, column=0, sticky="w", pady=(8, 0))
+        self.png_level = tk.IntVar(value=1)
+        ttk.Spinbox(opts, from_=1, to=9, width=4, textvariable=self.png_level, state="readonly")\
+            .grid(row=2, column=1, sticky="w", pady=(8, 0))
+        ttk.Label(opts, text="（1=高速 … 9=小サイズ、いずれも劣化なし）")\
+            .grid(row=2, column=2, columnspan=3, sticky="w", pady=(8, 0))
+
+        self.jpg_optimize = tk.BooleanVar(value=False)
+        ttk.Checkbutton(opts, text="Huffman最適化（JPEGのみ・低速）", variable=self.jpg_optimize)\
+            .grid(row=3, column=1, columnspan=2, sticky="w", pady=(8, 0))
+
+        self.skip_existing = tk.BooleanVar(value=False)
+        ttk.Checkbutton(opts, text="出力済みならスキップ", variable=self.skip_existing)\
+            .grid(row=3, column=3, columnspan=2, sticky="w", pady=(8, 0))
+
         # 進捗 & 開始
         self.progress = ttk.Progressbar(outer, maximum=100)
         self.progress.grid(row=3, column=0, columnspan=4, sticky="ew", pady=(0, 8))
@@ -271,8 +708,11 @@ class App:
         self.start_btn.grid(row=4, column=0, columnspan=4, sticky="ew", pady=(0, 8))
 
         # ログ
+        # 直近 LOG_MAX_LINES 行だけをリングバッファに保持し、一定間隔でまとめて描画する
         self.log = tk.Text(outer, height=14, state="disabled")
         self.log.grid(row=5, column=0, columnspan=4, sticky="nsew")
+        self._log_buf: Deque[str] = deque(maxlen=LOG_MAX_LINES)
+        self._log_dirty = False
 
         # レイアウト伸縮
         outer.grid_columnconfigure(0, weight=1)
@@ -288,6 +728,15 @@ class App:
         if not DND_AVAILABLE:
             self._append_log("※ D&Dを使うには 'pip install tkinterdnd2' を追加インストールしてください。\n")
 
+        self.root.after(LOG_REFRESH_MS, self._flush_log)
+
+        # ワーカースレッド → UI の通知キュー（UI_POLL_MS ごとにまとめて処理）
+        self._ui_q: "queue.Queue[Tuple[Callable, tuple]]" = queue.Queue()
+        self._pending_progress: Optional[int] = None  # 進捗は最新値だけを保持（1回の描画で反映）
+        # UI 側で反映済みの値。共有スロットは読むだけで消さない（読みと消去の間にワーカーが書いた最終値を失わないため）
+        self._shown_progress: Optional[int] = None
+        self.root.after(UI_POLL_MS, self._drain_ui)
+
     def _dump_environment(self):
         """Pillow / pillow-heif / OS / HEIF対応状況など、診断に有用な情報をログ表示"""
         try:
@@ -296,12 +745,6 @@ class App:
         except Exception:
             pil_ver = "(Pillow 不明)"
 
-        # Pillow features は環境によって 'heif' が Unknown になるので安全に判定
-        try:
-            heif_supported = bool(features.check("heif") or features.check("heif_decoder"))
-        except Exception:
-            heif_supported = False
-
         os_info = f"{platform.system()} {platform.release()} ({platform.version()})"
         arch_info = platform.machine()
         py_info = sys.version.replace("\n", " ")
@@ -310,13 +753,30 @@ class App:
             "=== 環境情報 ===",
             f"Pillow: {pil_ver}",
             f"pillow-heif 読み込み: {pillow_heif_loaded}, register_ok: {heif_register_ok}",
-            f"HEIF対応（Pillow features）: {heif_supported}",
+            f"HEIF対応（Pillow features）: {HEIF_VIA_PILLOW}",
             f"OS: {os_info}",
             f"Arch: {arch_info}",
             f"Python: {py_info}",
         ]
         if heif_summary_text:
             lines.append(heif_summary_text)
+        if jpeg_summary_text:
+            lines.append(jpeg_summary_text)
+        env_threads = os.environ.get(DECODE_THREADS_ENV)
+        threads_info = f"{env_threads}（{DECODE_THREADS_ENV}）" if env_threads else "自動（コア数 ÷ 並列プロセス数）"
+        lines.append(f"HEIF デコードスレッド: {threads_info}, CPU コア数: {os.cpu_count()}")
+        if not jpeg_turbo_ok:
+            lines.append("※ libjpeg-turbo（SIMD）が使われていません。JPEG 変換が遅くなるため "
+                         "'pip install -U pillow' で公式 wheel への更新を推奨します。")
+
+        # どの Pillow ビルド（公式 / Pillow-SIMD 等）が読み込まれているかを確認できるように
+        try:
+            lines.append(f"Pillow core: {Image.core.__file__}")
+            buf = io.StringIO()
+            features.pilinfo(out=buf, supported_formats=False)
+            lines.append(buf.getvalue().rstrip("\n"))
+        except Exception:
+            pass
         lines.append("================\n")
         for l in lines:
             self._append_log(l + ("\n" if not l.endswith("\n") else ""))
@@ -327,32 +787,22 @@ class App:
             widget.dnd_bind("<<Drop>>", self._on_drop)
 
     def _on_drop(self, event):
-        raw = event.data
-        paths: List[str] = []
-        buf, in_quotes = "", False
-        for ch in raw:
-            if ch == '"':
-                in_quotes = not in_quotes
-                if not in_quotes and buf:
-                    paths.append(buf); buf = ""
-            elif ch == " " and not in_quotes:
-                if buf:
-                    paths.append(buf); buf = ""
-            else:
-                buf += ch
-        if buf:
-            paths.append(buf)
-        self.add_paths(paths)
+        # event.data は Tcl のリスト。{波括弧}（入れ子含む）や \ エスケープは Tcl 自身に分解させる（C 実装で1回）
+        paths = self.root.tk.splitlist(event.data)
+        self.add_paths([p for p in paths if p])
 
     def add_paths(self, paths: List[str]):
         files = collect_heic_files([Path(p) for p in paths])
-        added = 0
+        new_files: List[Path] = []
         for f in files:
-            if f not in self.files:
-                self.files.append(f)
-                self.listbox.insert("end", str(f))
-                added += 1
-        self._append_log(f"+ 追加: {added} ファイル\n")
+            if f not in self._files_set:
+                self._files_set.add(f)
+                new_files.append(f)
+        self.files.extend(new_files)
+        if new_files:
+            # 1回の insert でまとめて追加（再描画も1回で済む）
+            self.listbox.insert("end", *[str(f) for f in new_files])
+        self._append_log(f"+ 追加: {len(new_files)} ファイル\n")
 
     def add_files(self):
         paths = filedialog.askopenfilenames(
@@ -369,6 +819,7 @@ class App:
 
     def clear_list(self):
         self.files.clear()
+        self._files_set.clear()
         self.listbox.delete(0, "end")
         self._append_log("リストをクリアしました。\n")
 
@@ -377,7 +828,8 @@ class App:
         sel.reverse()
         for idx in sel:
             try:
-                self.files.pop(idx)
+                f = self.files.pop(idx)
+                self._files_set.discard(f)
                 self.listbox.delete(idx)
             except Exception:
                 pass
@@ -396,33 +848,68 @@ class App:
         fmt = self.fmt_var.get()
         jpg_q = int(self.quality.get())
         keep_exif = bool(self.keep_exif.get())
+        png_level = int(self.png_level.get())
+        jpg_opt = bool(self.jpg_optimize.get())
+        skip = bool(self.skip_existing.get())
 
         self.start_btn.config(state="disabled")
         self.progress.config(value=0, maximum=len(self.files))
-        self._append_log(f"=== 変換開始（{fmt}, JPEG品質={jpg_q}, EXIF保持={keep_exif}）===\n")
+        self._pending_progress = None  # ワーカー起動前なので競合しない
+        self._shown_progress = None
+        self._append_log(f"=== 変換開始（{fmt}, JPEG品質={jpg_q}, EXIF保持={keep_exif}, PNG圧縮={png_level}, Huffman最適化={jpg_opt}, スキップ={skip}）===\n")
 
-        # ワーカーからの通知を UI スレッドにディスパッチ
+        # ワーカーからの通知はキューに積むだけ（Tk には触らない）。UI スレッドの _drain_ui が処理する
         def on_progress(done, total):
-            self.root.after(0, lambda: self.progress.config(value=done))
+            self._pending_progress = done  # キューには積まず、最新値で上書き
 
         def on_log(msg: str):
-            self.root.after(0, lambda: self._append_log(msg + ("" if msg.endswith("\n") else "\n")))
+            self._ui_q.put((self._append_log, (msg + ("" if msg.endswith("\n") else "\n"),)))
 
         def on_done():
             def _finish():
                 self._append_log("=== 完了 ===\n")
                 self.start_btn.config(state="normal")
                 messagebox.showinfo("完了", "変換が完了しました。")
-            self.root.after(0, _finish)
+            self._ui_q.put((_finish, ()))
 
-        t = ConverterThread(self.files, self.out_dir, fmt, jpg_q, keep_exif, on_progress, on_log, on_done)
+        t = ConverterThread(self.files, self.out_dir, fmt, jpg_q, keep_exif, on_progress, on_log, on_done,
+                            png_compress_level=png_level, jpg_optimize=jpg_opt,
+                            skip_existing=skip)
         t.start()
 
+    def _drain_ui(self):
+        """ワーカーから届いた UI 操作をまとめて実行し、次回を予約する"""
+        try:
+            done = self._pending_progress
+            if done is not None and done != self._shown_progress:
+                self._shown_progress = done
+                self.progress.config(value=done)
+            while True:
+                try:
+                    op, args = self._ui_q.get_nowait()
+                except queue.Empty:
+                    break
+                op(*args)
+        finally:
+            self.root.after(UI_POLL_MS, self._drain_ui)
+
     def _append_log(self, text: str):
-        self.log.configure(state="normal")
-        self.log.insert("end", text)
-        self.log.see("end")
-        self.log.configure(state="disabled")
+        """ログをバッファに積む（描画は _flush_log がまとめて行う）
+        ワーカーからはまとめ送りされた複数行や traceback が1回で届くので、行単位に分けて上限を数える。
+        """
+        self._log_buf.extend(text.splitlines(keepends=True))
+        self._log_dirty = True
+
+    def _flush_log(self):
+        """LOG_REFRESH_MS ごとにバッファの内容で Text を置き換える（行数上限でメモリと描画コストを一定に保つ）"""
+        if self._log_dirty:
+            self._log_dirty = False
+            self.log.configure(state="normal")
+            self.log.delete("1.0", "end")
+            self.log.insert("end", "".join(self._log_buf))
+            self.log.see("end")
+            self.log.configure(state="disabled")
+        self.root.after(LOG_REFRESH_MS, self._flush_log)
 
 
 def main():
@@ -447,4 +934,5 @@ def main():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # PyInstaller 等で凍結した exe からプロセスプールを使うため
     main()